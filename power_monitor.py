@@ -9,24 +9,326 @@ Usage:
 
 import argparse
 import csv
-import subprocess
+import ctypes
+import fcntl
+import functools
+import math
+import queue
+import re
+import select
+import shutil
+import struct
+import threading
 import time
 import sys
 import os
+import platform
 import signal
-from datetime import datetime
+from collections import namedtuple
 from pathlib import Path
 
 
+# Linux IPMI device interface (include/uapi/linux/ipmi.h)
+IPMI_DEVICE = "/dev/ipmi0"
+IPMI_SYSTEM_INTERFACE_ADDR_TYPE = 0x0c
+IPMI_BMC_CHANNEL = 0x0f
+IPMI_BMC_SLAVE_ADDR = 0x20
+IPMI_MAX_MSG_LENGTH = 272
+
+# DCMI Get Power Reading (group extension NetFn, DCMI group ID,
+# mode 0x01 = system power statistics)
+DCMI_NETFN = 0x2c
+DCMI_CMD_GET_POWER_READING = 0x02
+DCMI_GROUP_ID = 0xdc
+DCMI_POWER_READING_REQ = bytes([DCMI_GROUP_ID, 0x01, 0x00, 0x00])
+
+
+class IpmiSystemInterfaceAddr(ctypes.Structure):
+    _fields_ = [
+        ("addr_type", ctypes.c_int),
+        ("channel", ctypes.c_short),
+        ("lun", ctypes.c_ubyte),
+    ]
+
+
+class IpmiMsg(ctypes.Structure):
+    _fields_ = [
+        ("netfn", ctypes.c_ubyte),
+        ("cmd", ctypes.c_ubyte),
+        ("data_len", ctypes.c_ushort),
+        ("data", ctypes.c_void_p),
+    ]
+
+
+class IpmiReq(ctypes.Structure):
+    _fields_ = [
+        ("addr", ctypes.c_void_p),
+        ("addr_len", ctypes.c_uint),
+        ("msgid", ctypes.c_long),
+        ("msg", IpmiMsg),
+    ]
+
+
+class IpmiRecv(ctypes.Structure):
+    _fields_ = [
+        ("recv_type", ctypes.c_int),
+        ("addr", ctypes.c_void_p),
+        ("addr_len", ctypes.c_uint),
+        ("msgid", ctypes.c_long),
+        ("msg", IpmiMsg),
+    ]
+
+
+def _ipmi_ioc(direction, nr, size):
+    """Build an IPMI ioctl request number (_IOC with magic 'i')"""
+    return (direction << 30) | (size << 16) | (ord('i') << 8) | nr
+
+
+IPMICTL_RECEIVE_MSG_TRUNC = _ipmi_ioc(3, 11, ctypes.sizeof(IpmiRecv))
+IPMICTL_SEND_COMMAND = _ipmi_ioc(2, 13, ctypes.sizeof(IpmiReq))
+IPMICTL_SET_MY_ADDRESS_CMD = _ipmi_ioc(2, 17, ctypes.sizeof(ctypes.c_uint))
+
+
+# timerfd (sys/timerfd.h) for periodic sampler wakeups
+CLOCK_MONOTONIC = 1
+TFD_TIMER_ABSTIME = 1
+
+
+class Timespec(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_long),
+        ("tv_nsec", ctypes.c_long),
+    ]
+
+
+class Itimerspec(ctypes.Structure):
+    _fields_ = [
+        ("it_interval", Timespec),
+        ("it_value", Timespec),
+    ]
+
+
+def _timespec(seconds):
+    """Convert seconds to a Timespec"""
+    return Timespec(*divmod(round(seconds * 1_000_000_000), 1_000_000_000))
+
+
+def _open_timerfd(first, interval):
+    """
+    Create a CLOCK_MONOTONIC timerfd that first expires at absolute time
+    `first` (time.monotonic() seconds) and then every `interval` seconds
+    Returns the file descriptor, raises OSError if timerfd is unavailable
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        timerfd_create = libc.timerfd_create
+        timerfd_settime = libc.timerfd_settime
+    except AttributeError as e:
+        raise OSError(f"timerfd not available: {e}") from e
+
+    fd = timerfd_create(CLOCK_MONOTONIC, os.O_CLOEXEC)
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    spec = Itimerspec(_timespec(interval), _timespec(first))
+    if timerfd_settime(fd, TFD_TIMER_ABSTIME, ctypes.byref(spec), None) < 0:
+        err = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(err, os.strerror(err))
+    return fd
+
+
+# perf_event RAPL counters (raw 64-bit energy, no text formatting)
+PERF_POWER_PMU = Path("/sys/bus/event_source/devices/power")
+PERF_FLAG_FD_CLOEXEC = 8
+NR_PERF_EVENT_OPEN = {"x86_64": 298, "i386": 336, "i686": 336}
+
+
+class PerfEventAttr(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("config", ctypes.c_uint64),
+        # Remaining PERF_ATTR_SIZE_VER5 fields, all left zero
+        ("reserved", ctypes.c_uint8 * 96),
+    ]
+
+
+def _open_perf_energy_event(event):
+    """
+    Open a system-wide power PMU event (e.g. "energy-pkg") on the first
+    CPU of package 0
+    Returns (fd, microjoules per raw count), raises OSError if unavailable
+    """
+    nr = NR_PERF_EVENT_OPEN.get(platform.machine())
+    if nr is None:
+        raise OSError(f"perf_event_open not supported on {platform.machine()}")
+
+    try:
+        pmu_type = int((PERF_POWER_PMU / "type").read_text())
+        config = int((PERF_POWER_PMU / "events" / event).read_text()
+                     .strip().split("=")[1], 0)
+        scale = float((PERF_POWER_PMU / "events" / f"{event}.scale").read_text())
+        cpu = int(re.split(r"[,-]", (PERF_POWER_PMU / "cpumask").read_text())[0])
+    except (IndexError, ValueError) as e:
+        raise OSError(f"cannot parse power PMU event {event}: {e}") from e
+
+    attr = PerfEventAttr(type=pmu_type, size=ctypes.sizeof(PerfEventAttr), config=config)
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.syscall.restype = ctypes.c_long
+    fd = libc.syscall(ctypes.c_long(nr), ctypes.byref(attr), ctypes.c_long(-1),
+                      ctypes.c_long(cpu), ctypes.c_long(-1),
+                      ctypes.c_long(PERF_FLAG_FD_CLOEXEC))
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    # The scale converts raw counts to Joules
+    return fd, scale * 1_000_000
+
+
+class FreeIpmi:
+    """
+    In-process DCMI power reading through libfreeipmi
+    Raises OSError from the constructor if the library or an in-band
+    interface is not available
+    """
+
+    LIBRARY = "libfreeipmi.so.17"
+    DCMI_MODE_SYSTEM_POWER_STATISTICS = 0x01
+
+    def __init__(self):
+        try:
+            lib = ctypes.CDLL(self.LIBRARY)
+            lib.ipmi_ctx_create.restype = ctypes.c_void_p
+            lib.ipmi_ctx_create.argtypes = []
+            lib.ipmi_ctx_find_inband.argtypes = [
+                ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.c_int,
+                ctypes.c_uint16, ctypes.c_uint8, ctypes.c_char_p,
+                ctypes.c_uint, ctypes.c_uint]
+            lib.ipmi_ctx_errormsg.restype = ctypes.c_char_p
+            lib.ipmi_ctx_errormsg.argtypes = [ctypes.c_void_p]
+            lib.ipmi_ctx_close.argtypes = [ctypes.c_void_p]
+            lib.ipmi_ctx_destroy.argtypes = [ctypes.c_void_p]
+            lib.fiid_obj_create.restype = ctypes.c_void_p
+            lib.fiid_obj_create.argtypes = [ctypes.c_void_p]
+            lib.fiid_obj_get.argtypes = [
+                ctypes.c_void_p, ctypes.c_char_p, ctypes.POINTER(ctypes.c_uint64)]
+            lib.fiid_obj_destroy.argtypes = [ctypes.c_void_p]
+            lib.ipmi_cmd_dcmi_get_power_reading.argtypes = [
+                ctypes.c_void_p, ctypes.c_uint8, ctypes.c_uint8, ctypes.c_void_p]
+            tmpl = ctypes.c_char.in_dll(lib, "tmpl_cmd_dcmi_get_power_reading_rs")
+        except AttributeError as e:
+            raise OSError(f"{self.LIBRARY}: {e}") from e
+        self._lib = lib
+
+        self._ctx = lib.ipmi_ctx_create()
+        if not self._ctx:
+            raise OSError("ipmi_ctx_create failed")
+
+        # Probe for any in-band driver (OpenIPMI, KCS, SSIF, ...)
+        driver_type = ctypes.c_int(0)
+        if lib.ipmi_ctx_find_inband(self._ctx, ctypes.byref(driver_type),
+                                    0, 0, 0, None, 0, 0) != 1:
+            lib.ipmi_ctx_destroy(self._ctx)
+            raise OSError("no in-band IPMI interface found")
+
+        # Response object and output value are reused for every reading
+        self._obj = lib.fiid_obj_create(ctypes.addressof(tmpl))
+        if not self._obj:
+            lib.ipmi_ctx_close(self._ctx)
+            lib.ipmi_ctx_destroy(self._ctx)
+            raise OSError("fiid_obj_create failed")
+        self._value = ctypes.c_uint64()
+
+    def read_power(self):
+        """
+        Issue DCMI Get Power Reading
+        Returns current power in Watts, raises OSError on failure
+        """
+        lib = self._lib
+        if lib.ipmi_cmd_dcmi_get_power_reading(
+                self._ctx, self.DCMI_MODE_SYSTEM_POWER_STATISTICS, 0, self._obj) < 0:
+            raise OSError(lib.ipmi_ctx_errormsg(self._ctx).decode(errors='replace'))
+        if lib.fiid_obj_get(self._obj, b"current_power", ctypes.byref(self._value)) != 1:
+            raise OSError("current_power missing from DCMI response")
+        return float(self._value.value)
+
+    def close(self):
+        """Release the response object and IPMI context"""
+        self._lib.fiid_obj_destroy(self._obj)
+        self._lib.ipmi_ctx_close(self._ctx)
+        self._lib.ipmi_ctx_destroy(self._ctx)
+
+
+# ipmitool run started by the subprocess fallback (pidfd is None if
+# pidfd_open is unavailable)
+IpmitoolProcess = namedtuple('IpmitoolProcess', ['pid', 'pidfd'])
+
+# Raw reading taken by the sampling thread (RAPL power is derived later)
+Sample = namedtuple('Sample', ['timestamp_unix', 'ipmi_watts',
+                               'rapl_energy_uj', 'rapl_domain_energy_uj'])
+
+
+def _exit_code(status):
+    """Convert a waitpid() status to an exit code (-signal if killed)"""
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return -os.WTERMSIG(status)
+
+
+@functools.lru_cache(maxsize=4)
+def _format_second(sec):
+    """Format a whole Unix second as local time (cached: rows share seconds)"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sec))
+
+
+def _format_ts(ts):
+    """
+    Format a Unix timestamp as local time with millisecond precision
+    Same output as datetime.fromtimestamp(ts).strftime('...%f')[:-3]
+    """
+    sec = math.floor(ts)
+    us = round((ts - sec) * 1_000_000)
+    if us == 1_000_000:
+        sec += 1
+        us = 0
+    return f"{_format_second(sec)}.{us // 1000:03d}"
+
+
 class PowerMonitor:
     """Monitor power consumption via IPMI and RAPL"""
 
-    def __init__(self, interval=1.0, output_file=None, verbose=True):
+    CSV_FIELDS = ['timestamp', 'timestamp_unix', 'ipmi_watts',
+                  'rapl_pkg_watts', 'rapl_energy_uj']
+    CSV_BATCH_SIZE = 128
+
+    # Rows between dropping already-written CSV pages from the page cache
+    CSV_FADVISE_ROWS = 1024
+
+    # Maximum console lines collected into one write
+    PRINT_BATCH_SIZE = 8
+    _PRINT_FMT = "[{}] IPMI: {:>10} | RAPL Package: {:>10}\n"
+
+    # SCHED_FIFO priority of the sampling thread (when permitted)
+    SAMPLER_RT_PRIORITY = 10
+
+    # perf power PMU event for the package domain
+    RAPL_PERF_EVENT = "energy-pkg"
+
+    # Consecutive IPMI failures before IPMI sampling is disabled for the run
+    IPMI_MAX_FAILURES = 5
+
+    # ipmitool dcmi output: "Instantaneous power reading: XXX Watts"
+    _IPMI_RE = re.compile(rb'Instantaneous power reading:\s*(\d+(?:\.\d+)?)')
+
+    def __init__(self, interval=1.0, output_file=None, verbose=True, cpu=None):
         self.interval = interval
         self.output_file = output_file
         self.verbose = verbose
+        self.cpu = cpu
         self.running = False
-        self.measurements = []
 
         # RAPL paths
         self.rapl_base = Path("/sys/class/powercap/intel-rapl")
@@ -37,24 +339,78 @@ class PowerMonitor:
         self.prev_rapl_energy = None
         self.prev_rapl_time = None
 
+        # In-process IPMI (opened once, used for every sample when available):
+        # /dev/ipmi0 ioctl first, then libfreeipmi, otherwise ipmitool
+        self._ipmi_fd = None
+        self._freeipmi = None
+        self._ipmi_direct_ok = False
+        self._ipmitool_path = shutil.which("ipmitool")
+        self._ipmitool_pipe = None
+        self._ipmitool_buf = memoryview(bytearray(4096))
+        self._ipmi_fail = 0
+        self._ipmi_disabled = False
+        self._open_ipmi_device()
+        if self._ipmi_fd is None:
+            try:
+                self._freeipmi = FreeIpmi()
+            except OSError:
+                pass
+
         # Validate interfaces
         self._check_interfaces()
 
+        # Package energy: raw perf_event counter when permitted, otherwise
+        # keep the sysfs counter open for the whole run (read with pread)
+        self._rapl_fd = None
+        self._rapl_perf_fd = None
+        self._rapl_perf_scale = None
+        try:
+            self._rapl_perf_fd, self._rapl_perf_scale = \
+                _open_perf_energy_event(self.RAPL_PERF_EVENT)
+        except OSError:
+            self._rapl_fd = os.open(self.rapl_energy_file, os.O_RDONLY | os.O_CLOEXEC)
+
+        # Counter wraparound modulus, read once
+        self._rapl_max = self._read_energy_range(self.rapl_package)
+
+        # Additional RAPL domains (other packages, core/uncore/dram, psys)
+        self._rapl_domains = self._open_rapl_domains()
+        self._prev_domain_energy = [None] * len(self._rapl_domains)
+        self._prev_domain_time = None
+        self.csv_fields = self.CSV_FIELDS + [
+            f"rapl_{label}_watts" for label, _, _ in self._rapl_domains]
+
+        # CSV output: rows are staged in a fixed buffer and written every
+        # CSV_BATCH_SIZE samples instead of being kept for the whole run
+        self._csv_file = None
+        self._csv_writer = None
+        self._buf = [None] * self.CSV_BATCH_SIZE
+        self._buf_i = 0
+        self._rows_written = 0
+        self._rows_fadvised = 0
+        if self.output_file:
+            self._open_csv()
+
+        # Console lines are collected and written with a single os.write();
+        # on a terminal batch only as many as arrive within about a second
+        self._print_buf = bytearray()
+        self._print_pending = 0
+        self._print_batch = self.PRINT_BATCH_SIZE
+        if self.verbose and interval > 0 and sys.stdout.isatty():
+            self._print_batch = max(1, min(self.PRINT_BATCH_SIZE, int(1 / interval)))
+
+        # Per-sample function with the hot path bound to local names
+        self._sample = self._make_sample_fn()
+
     def _check_interfaces(self):
         """Check if IPMI and RAPL interfaces are available"""
         errors = []
 
-        # Check ipmitool
-        try:
-            result = subprocess.run(
-                ["which", "ipmitool"],
-                capture_output=True,
-                check=False
-            )
-            if result.returncode != 0:
-                errors.append("ipmitool not found in PATH")
-        except Exception as e:
-            errors.append(f"Error checking ipmitool: {e}")
+        # Check ipmitool (only needed without in-process IPMI)
+        if self._ipmi_fd is None and self._freeipmi is None and \
+                self._ipmitool_path is None:
+            errors.append(f"{IPMI_DEVICE} and libfreeipmi not available "
+                          "and ipmitool not found in PATH")
 
         # Check RAPL
         if not self.rapl_energy_file.exists():
@@ -74,43 +430,344 @@ class PowerMonitor:
                 print(f"  - {error}", file=sys.stderr)
             sys.exit(1)
 
+    @staticmethod
+    def _read_energy_range(zone):
+        """
+        Read a RAPL zone's max_energy_range_uj (where energy_uj wraps)
+        Falls back to 2**32 if the attribute is not readable
+        """
+        try:
+            return int((zone / "max_energy_range_uj").read_text())
+        except (OSError, ValueError):
+            return 2**32
+
+    def _open_rapl_domains(self):
+        """
+        Open every readable RAPL domain other than the primary package
+        Returns list of (label, fd, max_energy_range_uj),
+        e.g. ("package_0_dram", 5, 65712999613)
+        """
+        domains = []
+        energy_files = sorted(self.rapl_base.glob("intel-rapl:*/energy_uj")) + \
+            sorted(self.rapl_base.glob("intel-rapl:*/intel-rapl:*:*/energy_uj"))
+
+        for energy_file in energy_files:
+            zone = energy_file.parent
+            if zone == self.rapl_package:
+                continue
+            try:
+                name = (zone / "name").read_text().strip()
+                if zone.parent != self.rapl_base:
+                    name = (zone.parent / "name").read_text().strip() + "-" + name
+                fd = os.open(energy_file, os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                continue
+            domains.append((name.replace("-", "_"), fd, self._read_energy_range(zone)))
+
+        return domains
+
+    def _open_ipmi_device(self):
+        """
+        Open the kernel IPMI device and preallocate the request buffers
+        Leaves self._ipmi_fd as None if the device is not available
+        """
+        try:
+            fd = os.open(IPMI_DEVICE, os.O_RDWR | os.O_CLOEXEC)
+        except OSError:
+            return
+
+        # Register the default BMC slave address; the driver default is
+        # the same, so a failure here is not fatal
+        try:
+            fcntl.ioctl(fd, IPMICTL_SET_MY_ADDRESS_CMD,
+                        struct.pack('I', IPMI_BMC_SLAVE_ADDR))
+        except OSError:
+            pass
+
+        # Buffers referenced by pointer from the request/receive structs
+        self._ipmi_addr = IpmiSystemInterfaceAddr(
+            IPMI_SYSTEM_INTERFACE_ADDR_TYPE, IPMI_BMC_CHANNEL, 0)
+        self._ipmi_req_data = ctypes.create_string_buffer(
+            DCMI_POWER_READING_REQ, len(DCMI_POWER_READING_REQ))
+        self._ipmi_recv_addr = IpmiSystemInterfaceAddr()
+        self._ipmi_recv_data = ctypes.create_string_buffer(IPMI_MAX_MSG_LENGTH)
+
+        self._ipmi_req = IpmiReq(
+            ctypes.addressof(self._ipmi_addr),
+            ctypes.sizeof(self._ipmi_addr),
+            0,
+            IpmiMsg(DCMI_NETFN, DCMI_CMD_GET_POWER_READING,
+                    len(DCMI_POWER_READING_REQ),
+                    ctypes.addressof(self._ipmi_req_data)))
+        self._ipmi_recv = IpmiRecv()
+        self._ipmi_fd = fd
+
+    def _close_ipmi_device(self):
+        """Close the kernel IPMI device or libfreeipmi context if open"""
+        if self._ipmi_fd is not None:
+            os.close(self._ipmi_fd)
+            self._ipmi_fd = None
+        if self._freeipmi is not None:
+            self._freeipmi.close()
+            self._freeipmi = None
+
+    def _send_ipmi_request(self):
+        """
+        Send DCMI Get Power Reading through /dev/ipmi0
+        Returns the message ID to match the response against
+        Raises OSError if the device request fails
+        """
+        req = self._ipmi_req
+        req.msgid += 1
+        fcntl.ioctl(self._ipmi_fd, IPMICTL_SEND_COMMAND, req)
+        return req.msgid
+
+    def _receive_ipmi_response(self, msgid, timeout=5):
+        """
+        Wait for the DCMI Get Power Reading response on /dev/ipmi0
+        Returns power in Watts, or None on a BMC error completion code
+        Raises OSError if the device request itself fails
+        """
+        recv = self._ipmi_recv
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self._ipmi_fd], [], [], remaining)[0]:
+                raise TimeoutError("no response from BMC")
+
+            recv.addr = ctypes.addressof(self._ipmi_recv_addr)
+            recv.addr_len = ctypes.sizeof(self._ipmi_recv_addr)
+            recv.msg.data = ctypes.addressof(self._ipmi_recv_data)
+            recv.msg.data_len = IPMI_MAX_MSG_LENGTH
+            fcntl.ioctl(self._ipmi_fd, IPMICTL_RECEIVE_MSG_TRUNC, recv)
+
+            # Discard late responses to earlier (timed out) requests
+            if recv.msgid == msgid:
+                break
+
+        # Response: completion code, group ID, current power (16-bit LE), ...
+        if recv.msg.data_len < 4:
+            if self.verbose:
+                print("Warning: Short DCMI power reading response", file=sys.stderr)
+            return None
+        completion, group_id, power = struct.unpack_from('<BBH', self._ipmi_recv_data)
+        if completion != 0 or group_id != DCMI_GROUP_ID:
+            if self.verbose:
+                print(f"Warning: DCMI power reading failed "
+                      f"(completion code 0x{completion:02x})", file=sys.stderr)
+            return None
+        return float(power)
+
+    def _ipmi_device_error(self, e):
+        """
+        Handle a failed in-process IPMI request
+        Switches to ipmitool if the interface has never returned a reading
+        """
+        if self._ipmi_direct_ok:
+            if self.verbose:
+                print(f"Warning: Error reading IPMI: {e}", file=sys.stderr)
+            return
+
+        if self.verbose:
+            interface = IPMI_DEVICE if self._ipmi_fd is not None else FreeIpmi.LIBRARY
+            print(f"Warning: {interface} request failed ({e}), "
+                  "falling back to ipmitool", file=sys.stderr)
+        self._close_ipmi_device()
+
+    def start_ipmi_read(self):
+        """
+        Issue an IPMI power reading without waiting for the result
+        Uses /dev/ipmi0 or libfreeipmi when available, ipmitool otherwise
+        Returns a pending handle for finish_ipmi_read(), or None on error
+        """
+        if self._ipmi_disabled:
+            return None
+
+        if self._ipmi_fd is not None:
+            try:
+                return self._send_ipmi_request()
+            except OSError as e:
+                self._ipmi_device_error(e)
+                if self._ipmi_fd is not None:
+                    return None
+
+        # libfreeipmi calls are blocking; the request is made in finish_ipmi_read()
+        if self._freeipmi is not None:
+            return self._freeipmi
+
+        return self._start_ipmi_subprocess()
+
+    def finish_ipmi_read(self, pending):
+        """
+        Wait for a reading issued by start_ipmi_read()
+        Disables IPMI sampling after IPMI_MAX_FAILURES consecutive errors
+        Returns power in Watts, or None on error
+        """
+        if self._ipmi_disabled:
+            return None
+
+        power = self._collect_ipmi_read(pending)
+        if power is not None:
+            self._ipmi_fail = 0
+            return power
+
+        self._ipmi_fail += 1
+        if self._ipmi_fail >= self.IPMI_MAX_FAILURES:
+            self._ipmi_disabled = True
+            self._close_ipmi_device()
+            print(f"Warning: IPMI disabled after {self._ipmi_fail} consecutive "
+                  "failures, continuing with RAPL only", file=sys.stderr)
+        return None
+
+    def _collect_ipmi_read(self, pending):
+        """
+        Complete a pending reading on whichever interface issued it
+        Returns power in Watts, or None on error
+        """
+        if pending is None:
+            return None
+
+        if isinstance(pending, IpmitoolProcess):
+            return self._finish_ipmi_subprocess(pending)
+
+        try:
+            if pending is self._freeipmi:
+                power = self._freeipmi.read_power()
+            else:
+                power = self._receive_ipmi_response(pending)
+            self._ipmi_direct_ok = True
+            return power
+        except OSError as e:
+            self._ipmi_device_error(e)
+            if self._ipmi_fd is not None or self._freeipmi is not None:
+                return None
+
+        # Interface was just abandoned - retry this sample with ipmitool
+        return self._collect_ipmi_read(self._start_ipmi_subprocess())
+
     def read_ipmi_power(self):
         """
         Read instantaneous power consumption via IPMI
         Returns power in Watts, or None on error
         """
+        return self.finish_ipmi_read(self.start_ipmi_read())
+
+    def _start_ipmi_subprocess(self):
+        """
+        Launch ipmitool for a power reading without waiting for it
+        Output goes to a pipe created once and reused for every run
+        Returns an IpmitoolProcess, or None on error
+        """
+        if self._ipmitool_path is None:
+            if self.verbose:
+                print("Warning: ipmitool not found in PATH", file=sys.stderr)
+            return None
+
         try:
-            result = subprocess.run(
-                ["ipmitool", "dcmi", "power", "reading"],
-                capture_output=True,
-                text=True,
-                timeout=5,
-                check=False
+            if self._ipmitool_pipe is None:
+                read_fd, write_fd = os.pipe2(os.O_CLOEXEC)
+                os.set_blocking(read_fd, False)
+                self._ipmitool_pipe = (read_fd, write_fd)
+            write_fd = self._ipmitool_pipe[1]
+
+            # stdout and stderr share the pipe; the sampler's SCHED_FIFO
+            # policy is not passed on to ipmitool
+            pid = os.posix_spawn(
+                self._ipmitool_path,
+                [self._ipmitool_path, "dcmi", "power", "reading"],
+                os.environ,
+                file_actions=[
+                    (os.POSIX_SPAWN_DUP2, write_fd, 1),
+                    (os.POSIX_SPAWN_DUP2, write_fd, 2),
+                ],
+                scheduler=(os.SCHED_OTHER, os.sched_param(0))
             )
+        except Exception as e:
+            if self.verbose:
+                print(f"Warning: Error reading IPMI: {e}", file=sys.stderr)
+            return None
+
+        try:
+            pidfd = os.pidfd_open(pid)
+        except (AttributeError, OSError):
+            pidfd = None
+        return IpmitoolProcess(pid, pidfd)
+
+    def _wait_ipmi_subprocess(self, proc, timeout):
+        """
+        Wait for ipmitool to exit, killing it after timeout seconds
+        Returns the exit code, or None on timeout
+        """
+        try:
+            if proc.pidfd is not None:
+                if select.select([proc.pidfd], [], [], timeout)[0]:
+                    _, status = os.waitpid(proc.pid, 0)
+                    return _exit_code(status)
+            else:
+                deadline = time.monotonic() + timeout
+                while time.monotonic() < deadline:
+                    pid, status = os.waitpid(proc.pid, os.WNOHANG)
+                    if pid:
+                        return _exit_code(status)
+                    time.sleep(0.001)
+
+            os.kill(proc.pid, signal.SIGKILL)
+            os.waitpid(proc.pid, 0)
+            return None
+        finally:
+            if proc.pidfd is not None:
+                os.close(proc.pidfd)
+
+    def _drain_ipmitool_pipe(self):
+        """
+        Read everything ipmitool wrote into the reusable output buffer
+        Returns a memoryview of the output
+        """
+        read_fd = self._ipmitool_pipe[0]
+        buf = self._ipmitool_buf
+        n = 0
+        try:
+            while n < len(buf):
+                got = os.readv(read_fd, [buf[n:]])
+                if got == 0:
+                    break
+                n += got
+            # Discard anything beyond the buffer so the next run starts clean
+            while os.read(read_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return buf[:n]
+
+    def _finish_ipmi_subprocess(self, proc, timeout=5):
+        """
+        Collect and parse the output of a running ipmitool
+        Returns power in Watts, or None on error
+        """
+        try:
+            returncode = self._wait_ipmi_subprocess(proc, timeout)
+            output = self._drain_ipmitool_pipe()
 
-            if result.returncode != 0:
+            if returncode is None:
                 if self.verbose:
-                    print(f"Warning: ipmitool failed: {result.stderr.strip()}",
+                    print("Warning: ipmitool timeout", file=sys.stderr)
+                return None
+
+            if returncode != 0:
+                if self.verbose:
+                    print(f"Warning: ipmitool failed: "
+                          f"{bytes(output).decode(errors='replace').strip()}",
                           file=sys.stderr)
                 return None
 
-            # Parse output - looking for "Instantaneous power reading: XXX Watts"
-            for line in result.stdout.split('\n'):
-                if "Instantaneous power reading" in line:
-                    # Extract number before "Watts"
-                    parts = line.split(':')
-                    if len(parts) >= 2:
-                        power_str = parts[1].strip().split()[0]
-                        return float(power_str)
+            match = self._IPMI_RE.search(output)
+            if match:
+                return float(match.group(1))
 
             if self.verbose:
                 print("Warning: Could not parse IPMI output", file=sys.stderr)
             return None
 
-        except subprocess.TimeoutExpired:
-            if self.verbose:
-                print("Warning: ipmitool timeout", file=sys.stderr)
-            return None
         except Exception as e:
             if self.verbose:
                 print(f"Warning: Error reading IPMI: {e}", file=sys.stderr)
@@ -122,14 +779,54 @@ class PowerMonitor:
         Returns energy in microjoules, or None on error
         """
         try:
-            with open(self.rapl_energy_file, 'r') as f:
-                energy_uj = int(f.read().strip())
-            return energy_uj
+            if self._rapl_perf_fd is not None:
+                raw, = struct.unpack('Q', os.read(self._rapl_perf_fd, 8))
+                return int(raw * self._rapl_perf_scale)
+            return int(os.pread(self._rapl_fd, 32, 0))
         except Exception as e:
             if self.verbose:
                 print(f"Warning: Error reading RAPL: {e}", file=sys.stderr)
             return None
 
+    def read_rapl_domains(self):
+        """
+        Read the energy counters of the additional RAPL domains
+        Returns list of energies in microjoules (None for failed reads)
+        """
+        energies = []
+        for label, fd, _ in self._rapl_domains:
+            try:
+                energies.append(int(os.pread(fd, 32, 0)))
+            except Exception as e:
+                if self.verbose:
+                    print(f"Warning: Error reading RAPL {label}: {e}", file=sys.stderr)
+                energies.append(None)
+        return energies
+
+    def calculate_domain_powers(self, energies, timestamp):
+        """
+        Calculate average power of the additional RAPL domains
+        Returns list of powers in Watts (None on first reading or error)
+        """
+        prev_time = self._prev_domain_time
+        self._prev_domain_time = timestamp
+
+        powers = []
+        for i, energy_uj in enumerate(energies):
+            energy_range = self._rapl_domains[i][2]
+            prev_energy = self._prev_domain_energy[i]
+            self._prev_domain_energy[i] = energy_uj
+
+            if energy_uj is None or prev_energy is None or prev_time is None \
+                    or timestamp <= prev_time:
+                powers.append(None)
+                continue
+
+            energy_delta_uj = (energy_uj - prev_energy) % energy_range
+            powers.append((energy_delta_uj / (timestamp - prev_time)) / 1_000_000)
+
+        return powers
+
     def calculate_rapl_power(self, energy_uj, timestamp):
         """
         Calculate average power from RAPL energy delta
@@ -141,17 +838,11 @@ class PowerMonitor:
             self.prev_rapl_time = timestamp
             return None
 
-        # Calculate delta
-        energy_delta_uj = energy_uj - self.prev_rapl_energy
+        # Calculate delta; the counter wraps at max_energy_range_uj, so the
+        # modulo gives the right delta across a rollover without a branch
+        energy_delta_uj = (energy_uj - self.prev_rapl_energy) % self._rapl_max
         time_delta_s = timestamp - self.prev_rapl_time
 
-        # Handle counter rollover (energy counter is typically 32-bit)
-        # Max value around 4.3 billion microjoules = ~4300 joules
-        if energy_delta_uj < 0:
-            # Counter rolled over
-            max_counter = 2**32  # Approximate, actual may vary
-            energy_delta_uj += max_counter
-
         # Store current values for next iteration
         self.prev_rapl_energy = energy_uj
         self.prev_rapl_time = timestamp
@@ -168,54 +859,175 @@ class PowerMonitor:
     def take_measurement(self):
         """
         Take a single measurement from all interfaces
-        Returns dict with timestamp and power readings
+        Returns a Sample with timestamp, IPMI power and raw RAPL counters;
+        RAPL power is derived later by derive_rapl_power()
+        """
+        return self._sample()
+
+    def _make_sample_fn(self):
         """
-        timestamp = time.time()
-        timestamp_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        Build the measurement function used by take_measurement()
+        Everything it touches is bound once to closure locals, so each
+        sample avoids repeated attribute and method lookups
+        """
+        now_ns = time.time_ns
+        pread = os.pread
+        domain_fds = [fd for _, fd, _ in self._rapl_domains]
+        start_ipmi = self.start_ipmi_read
+        finish_ipmi = self.finish_ipmi_read
+        read_rapl = self.read_rapl_energy
+        read_domains = self.read_rapl_domains
+
+        if self._rapl_perf_fd is not None:
+            read = os.read
+            unpack = struct.Struct('Q').unpack
+            perf_fd = self._rapl_perf_fd
+            perf_scale = self._rapl_perf_scale
+
+            def read_package():
+                return int(unpack(read(perf_fd, 8))[0] * perf_scale)
+        else:
+            rapl_fd = self._rapl_fd
 
-        # Read IPMI
-        ipmi_power = self.read_ipmi_power()
+            def read_package():
+                return int(pread(rapl_fd, 32, 0))
+
+        def sample():
+            # Start IPMI, read RAPL while the BMC request is in flight
+            ipmi_pending = start_ipmi()
+
+            # The timestamp is taken right after the package counter read
+            # so the RAPL energy/time pair brackets the same instant
+            try:
+                rapl_energy = read_package()
+                timestamp = now_ns() / 1e9
+                domain_energies = [int(pread(fd, 32, 0)) for fd in domain_fds]
+            except (OSError, ValueError, struct.error):
+                # Re-read through the checked path to report the failing counter
+                rapl_energy = read_rapl()
+                timestamp = now_ns() / 1e9
+                domain_energies = read_domains()
+            ipmi_power = finish_ipmi(ipmi_pending)
+
+            return Sample(timestamp, ipmi_power, rapl_energy, domain_energies)
+
+        return sample
+
+    def derive_rapl_power(self, sample):
+        """
+        Derive RAPL power (from energy deltas) for a sample
+        Called from the consumer side so the math stays off the sampling thread
+        Returns the measurement row in CSV column order (without the
+        formatted timestamp): timestamp_unix, ipmi_watts, rapl_pkg_watts,
+        rapl_energy_uj, then one power per additional RAPL domain
+        """
+        timestamp, ipmi_power, rapl_energy, domain_energies = sample
 
-        # Read RAPL
-        rapl_energy = self.read_rapl_energy()
         rapl_power = None
         if rapl_energy is not None:
             rapl_power = self.calculate_rapl_power(rapl_energy, timestamp)
 
-        measurement = {
-            'timestamp': timestamp_str,
-            'timestamp_unix': timestamp,
-            'ipmi_watts': ipmi_power,
-            'rapl_pkg_watts': rapl_power,
-            'rapl_energy_uj': rapl_energy
-        }
-
-        return measurement
+        return (timestamp, ipmi_power, rapl_power, rapl_energy,
+                *self.calculate_domain_powers(domain_energies, timestamp))
 
     def print_measurement(self, measurement):
-        """Print measurement to console"""
-        ipmi_str = f"{measurement['ipmi_watts']:.2f}W" if measurement['ipmi_watts'] is not None else "N/A"
-        rapl_str = f"{measurement['rapl_pkg_watts']:.2f}W" if measurement['rapl_pkg_watts'] is not None else "N/A"
+        """Queue measurement row for console output"""
+        timestamp, ipmi_power, rapl_power = measurement[:3]
+        ipmi_str = f"{ipmi_power:.2f}W" if ipmi_power is not None else "N/A"
+        rapl_str = f"{rapl_power:.2f}W" if rapl_power is not None else "N/A"
 
-        print(f"[{measurement['timestamp']}] IPMI: {ipmi_str:>10} | RAPL Package: {rapl_str:>10}")
+        self._print_buf += self._PRINT_FMT.format(
+            _format_ts(timestamp), ipmi_str, rapl_str).encode()
+        self._print_pending += 1
+        if self._print_pending >= self._print_batch:
+            self.flush_print()
 
-    def save_to_csv(self):
-        """Save all measurements to CSV file"""
-        if not self.output_file or not self.measurements:
+    def flush_print(self):
+        """Write queued console lines to stdout"""
+        if not self._print_buf:
             return
 
+        # Keep ordering with anything already written through sys.stdout
+        sys.stdout.flush()
+        view = memoryview(self._print_buf)
         try:
-            with open(self.output_file, 'w', newline='') as f:
-                fieldnames = ['timestamp', 'timestamp_unix', 'ipmi_watts',
-                             'rapl_pkg_watts', 'rapl_energy_uj']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(self.measurements)
+            while view:
+                view = view[os.write(sys.stdout.fileno(), view):]
+        except OSError:
+            pass
+        finally:
+            view.release()
+        self._print_buf.clear()
+        self._print_pending = 0
 
-            if self.verbose:
-                print(f"\nSaved {len(self.measurements)} measurements to {self.output_file}")
+    def _open_csv(self):
+        """Open the output CSV file and write the header"""
+        try:
+            fd = os.open(self.output_file,
+                         os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644)
+            self._csv_file = os.fdopen(fd, 'w', newline='', buffering=1 << 16)
+        except OSError as e:
+            print(f"ERROR: Cannot open output file: {e}", file=sys.stderr)
+            sys.exit(1)
+        self._csv_writer = csv.writer(self._csv_file)
+        self._csv_writer.writerow(self.csv_fields)
+
+    def record_measurement(self, measurement):
+        """Stage a measurement row for CSV output, writing a batch when full"""
+        if self._csv_writer is None:
+            return
+
+        self._buf[self._buf_i] = measurement
+        self._buf_i += 1
+        if self._buf_i == self.CSV_BATCH_SIZE:
+            self.flush_csv()
+
+    def flush_csv(self):
+        """Write staged measurements to the CSV file"""
+        if self._csv_writer is None or self._buf_i == 0:
+            return
+
+        # Human-readable timestamps are formatted here, outside the sampling
+        # path; the C csv writer then serializes the whole batch in one call
+        try:
+            self._csv_writer.writerows(
+                [(_format_ts(row[0]),) + row for row in self._buf[:self._buf_i]])
+            self._rows_written += self._buf_i
+
+            # Let the kernel reclaim written pages so long runs do not grow
+            # the page cache alongside the workload being measured
+            if self._rows_written - self._rows_fadvised >= self.CSV_FADVISE_ROWS:
+                self._csv_file.flush()
+                os.posix_fadvise(self._csv_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                self._rows_fadvised = self._rows_written
         except Exception as e:
-            print(f"Error saving to CSV: {e}", file=sys.stderr)
+            print(f"Error writing to CSV: {e}", file=sys.stderr)
+        self._buf_i = 0
+
+    def close(self):
+        """Flush pending CSV rows and release file descriptors"""
+        if self._csv_file is not None:
+            self.flush_csv()
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv_writer = None
+            if self.verbose:
+                print(f"\nSaved {self._rows_written} measurements to {self.output_file}")
+
+        self._close_ipmi_device()
+        if self._ipmitool_pipe is not None:
+            for fd in self._ipmitool_pipe:
+                os.close(fd)
+            self._ipmitool_pipe = None
+        if self._rapl_fd is not None:
+            os.close(self._rapl_fd)
+            self._rapl_fd = None
+        if self._rapl_perf_fd is not None:
+            os.close(self._rapl_perf_fd)
+            self._rapl_perf_fd = None
+        for _, fd, _ in self._rapl_domains:
+            os.close(fd)
+        self._rapl_domains = []
 
     def run(self, duration=None):
         """
@@ -225,7 +1037,10 @@ class PowerMonitor:
             duration: Duration in seconds, or None for infinite
         """
         self.running = True
-        start_time = time.time()
+        self._stop = threading.Event()
+        self._sampler_error = None
+        # Written on stop to wake a sampler blocked on its timerfd
+        self._stop_pipe = os.pipe2(os.O_CLOEXEC)
         measurement_count = 0
 
         print("=" * 80)
@@ -241,40 +1056,176 @@ class PowerMonitor:
         print()
 
         # Take initial RAPL reading (for delta calculation)
-        initial = self.take_measurement()
+        next_tick = time.monotonic()
+        self.derive_rapl_power(self.take_measurement())
         if self.verbose:
             print("Initial RAPL reading taken (no power calculated yet)")
 
+        # Sampling runs in its own thread; this thread prints and writes CSV
+        samples = queue.SimpleQueue()
+        sampler = threading.Thread(
+            target=self._sample_loop,
+            args=(samples, duration, next_tick),
+            name="power-sampler",
+            daemon=True
+        )
+        sampler.start()
+
+        interrupted = False
         try:
-            while self.running:
-                # Check duration
-                if duration and (time.time() - start_time) >= duration:
+            while True:
+                sample = samples.get()
+                if sample is None:
                     break
 
-                # Take measurement
-                measurement = self.take_measurement()
-                self.measurements.append(measurement)
+                measurement = self.derive_rapl_power(sample)
+                self.record_measurement(measurement)
                 measurement_count += 1
 
                 # Print to console
                 if self.verbose:
                     self.print_measurement(measurement)
 
-                # Sleep until next interval
-                time.sleep(self.interval)
-
         except KeyboardInterrupt:
-            print("\n\nMonitoring stopped by user (Ctrl+C)")
+            interrupted = True
 
         finally:
-            self.running = False
+            self._request_stop()
+            sampler.join()
+            for fd in self._stop_pipe:
+                os.close(fd)
+
+            # Keep samples taken before the sampler noticed the stop
+            while True:
+                try:
+                    sample = samples.get_nowait()
+                except queue.Empty:
+                    break
+                if sample is not None:
+                    measurement = self.derive_rapl_power(sample)
+                    self.record_measurement(measurement)
+                    measurement_count += 1
+                    if self.verbose:
+                        self.print_measurement(measurement)
+
+            # Batched lines must reach the console before the banners
+            self.flush_print()
+            if interrupted:
+                print("\n\nMonitoring stopped by user (Ctrl+C)")
+
             print("\n" + "=" * 80)
             print(f"Monitoring Complete - {measurement_count} measurements taken")
             print("=" * 80)
 
-            # Save to CSV
-            if self.output_file:
-                self.save_to_csv()
+            self.close()
+
+        # A dead sampler must not look like a clean run
+        if self._sampler_error is not None:
+            raise RuntimeError("Sampling thread failed") from self._sampler_error
+
+    def _setup_sampler_thread(self):
+        """Pin the calling thread to self.cpu and, unless busy-looping, raise it to SCHED_FIFO"""
+        if self.cpu is not None:
+            try:
+                os.sched_setaffinity(0, {self.cpu})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Cannot pin sampler to CPU {self.cpu}: {e}",
+                      file=sys.stderr)
+
+        # With --interval 0 the loop never blocks; at SCHED_FIFO it would
+        # starve everything else on its CPU
+        if self.interval <= 0:
+            return
+
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO,
+                                  os.sched_param(self.SAMPLER_RT_PRIORITY))
+        except OSError as e:
+            if self.verbose:
+                print(f"Warning: Cannot set SCHED_FIFO for sampler: {e}",
+                      file=sys.stderr)
+
+    def _request_stop(self):
+        """Stop the sampling thread, waking it if it is waiting for a tick"""
+        self.running = False
+        self._stop.set()
+        os.write(self._stop_pipe[1], b"\0")
+
+    def _sample_loop(self, samples, duration, next_tick):
+        """
+        Sampling thread: take measurements on schedule and queue them
+        Samples are scheduled at next_tick + n * interval; none is taken
+        after a stop request or past duration seconds from next_tick
+        A None sentinel is queued when sampling stops
+        """
+        timer_fd = None
+        try:
+            self._setup_sampler_thread()
+            sample = self._sample
+            put = samples.put
+
+            # Periodic kernel timer aligned to the initial reading; missed
+            # ticks are coalesced by the kernel, so a late sample skips ahead
+            if self.interval > 0:
+                try:
+                    timer_fd = _open_timerfd(next_tick + self.interval, self.interval)
+                except OSError as e:
+                    if self.verbose:
+                        print(f"Warning: timerfd unavailable ({e}), using sleep",
+                              file=sys.stderr)
+
+            # Small tolerance so float accumulation of next_tick does not
+            # drop the sample scheduled exactly at the end of the duration
+            end_tick = next_tick + duration + 1e-6 if duration else None
+
+            while self.running:
+                # Check duration
+                if end_tick is not None and next_tick + self.interval > end_tick:
+                    break
+
+                if timer_fd is not None:
+                    if self._stop_pipe[0] in select.select(
+                            [timer_fd, self._stop_pipe[0]], [], [])[0]:
+                        break
+                    # Expiration count: more than one if ticks were missed
+                    expirations, = struct.unpack('Q', os.read(timer_fd, 8))
+                    next_tick += self.interval * expirations
+                else:
+                    # Sleep until the next absolute deadline so per-sample work
+                    # does not accumulate as drift; if late, resync to now
+                    next_tick += self.interval
+                    delay = next_tick - time.monotonic()
+                    if delay > 0:
+                        if self._stop.wait(delay):
+                            break
+                    else:
+                        next_tick = time.monotonic()
+
+                # Re-check after waking: never sample after a stop request
+                # or past the requested duration
+                if not self.running or (end_tick is not None and next_tick > end_tick):
+                    break
+
+                put(sample())
+        except Exception as e:
+            self._sampler_error = e
+        finally:
+            if timer_fd is not None:
+                os.close(timer_fd)
+            samples.put(None)
+
+
+def cpu_number(value):
+    """argparse type: a CPU this process is allowed to run on"""
+    try:
+        cpu = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid CPU number: {value}")
+    allowed = os.sched_getaffinity(0)
+    if cpu not in allowed:
+        raise argparse.ArgumentTypeError(
+            f"CPU {cpu} not available (allowed: {','.join(map(str, sorted(allowed)))})")
+    return cpu
 
 
 def main():
@@ -294,6 +1245,9 @@ Examples:
 
   # Quiet mode (no console output, only CSV)
   sudo ./power_monitor.py --duration 60 --output quiet.csv --quiet
+
+  # Keep the sampler on housekeeping CPU 0
+  sudo ./power_monitor.py --duration 60 --output test1.csv --cpu 0
         """
     )
 
@@ -324,6 +1278,13 @@ Examples:
         help='Quiet mode - no console output'
     )
 
+    parser.add_argument(
+        '--cpu', '-c',
+        type=cpu_number,
+        default=None,
+        help='Pin the sampling thread to this CPU, e.g. a housekeeping core (optional)'
+    )
+
     args = parser.parse_args()
 
     # Check if running as root
@@ -337,7 +1298,8 @@ Examples:
     monitor = PowerMonitor(
         interval=args.interval,
         output_file=args.output,
-        verbose=not args.quiet
+        verbose=not args.quiet,
+        cpu=args.cpu
     )
 
     # Run monitoring